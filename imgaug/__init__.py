@@ -1 +1,5 @@
+from logging import NullHandler, getLogger
+
 name = 'image_augmenter'
+
+getLogger(__name__).addHandler(NullHandler())
@@ -1,16 +1,62 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from glob import glob
-from os import path
+from os import cpu_count, path
 from io import BytesIO
-from logging import info
-from multiprocessing import Process
-from random import choices
-from string import ascii_letters, digits
-from tempfile import mkdtemp
-from zipfile import ZipFile
-from matplotlib import pyplot as plt
+from itertools import chain, islice
+from logging import getLogger
+from secrets import token_urlsafe
+from time import localtime
+from zipfile import ZIP_STORED, ZipFile, ZipInfo
+from zlib import Z_RLE
+import numpy as np
+from PIL import Image
 from imgaug import image
 
+logger = getLogger(__name__)
+_worker = None
+
+
+class Encoder:
+    '''
+    Synopsis
+    --------
+    Encodes the specified Numpy image data into the stream-like object, by
+    using the format matching the extension.
+    Float data is accepted too, being scaled from the [0, 1] range.
+
+    Examples
+    --------
+    >>> enc = Encoder()
+    >>> stream = enc(np.zeros((4, 4, 3)), 'png', BytesIO())
+    >>> stream.getvalue()[1:4]
+    b'PNG'
+    '''
+
+    PNG = 'PNG'
+    JPEG = 'JPEG'
+    FORMATS = {'png': PNG, 'jpg': JPEG, 'jpeg': JPEG}
+    RGB = 'RGB'
+    RGBA = 'RGBA'
+    PARAMS = {PNG: {'compress_level': 1, 'compress_type': Z_RLE, 'optimize': False},
+              JPEG: {'quality': 90, 'optimize': False, 'progressive': False}}
+    MAX = 255
+
+    def __call__(self, data, ext, stream):
+        img = Image.fromarray(np.ascontiguousarray(self._uint8(data)))
+        fmt = self.FORMATS[ext]
+        if fmt == self.JPEG and img.mode == self.RGBA:
+            img = img.convert(self.RGB)
+        img.save(stream, format=fmt, **self.PARAMS[fmt])
+        return stream
+
+    def _uint8(self, data):
+        if data.dtype == np.uint8:
+            return data
+        data = np.clip(data * self.MAX, 0, self.MAX)
+        return data.astype(np.uint8, copy=False)
+
 
 class Persister:
     '''
@@ -31,18 +77,18 @@ class Persister:
     JPG = 'jpg'
     PNG = 'png'
 
-    def __init__(self, filename, stream=None, action=lambda *args: args[0], label=None, labeller=image.Labeller(), normalizer=image.Normalizer(), augmenter=image.Augmenter()):
+    def __init__(self, filename, stream=None, action=lambda *args: args[0], label=None, labeller=image.Labeller(), normalizer=image.Normalizer(), augmenter=image.Augmenter(), encoder=Encoder()):
         self.action = action
         self.label = label or labeller(filename)
         self.norm = normalizer(stream or filename)
         self.ext = self._ext()
         self.augmenter = augmenter
+        self.encoder = encoder
 
     def __iter__(self):
         for i, data in enumerate(self.augmenter(self.norm)):
             name = f'{self.label}_{i:03}.{self.ext}'
-            stream = BytesIO()
-            plt.imsave(stream, data)
+            stream = self.encoder(data, self.ext, BytesIO())
             filepath = self.action(name, stream)
             yield(self.label, filepath)
 
@@ -59,9 +105,11 @@ class Zipper:
     * iterating images within the specified folder
     * recognizing each label
     * creating an archive with label name
-    * normalizing and augmenting the image
+    * normalizing and augmenting the images in parallel, by using a pool of processes,
+      each one holding its own collaborators
     * archive images within the specified label-named folder
-    * generating a distinct compressed file by checking the x-zip attribute
+    * writing each entry as soon as it is produced, rolling to a distinct
+      compressed file every x-zip entries
 
     Examples
     --------
@@ -74,13 +122,23 @@ class Zipper:
     SIZE = 64
     EXTS = {'png', 'jpg', 'jpeg'}
     X_ZIP = 30000
-
-    def __init__(self, folder, size=SIZE, x_zip=X_ZIP, cutoff=1., labeller=image.Labeller(), normalizer_cls=image.Normalizer, augmenter_cls=image.Augmenter):
+    WORKERS = cpu_count()
+    PENDING = 2
+    # PNG/JPEG entries are already compressed: deflating them again costs CPU for no gain
+    COMPRESSION = ZIP_STORED
+    BUFFER = 8 * 1024 * 1024
+    PERMISSIONS = 0o644
+
+    def __init__(self, folder, size=SIZE, x_zip=X_ZIP, cutoff=1., labeller=image.Labeller(), normalizer_cls=image.Normalizer, augmenter_cls=image.Augmenter, encoder=Encoder(), workers=WORKERS):
         self.files = self._files(folder)
         self.labeller = labeller
         self.norm = normalizer_cls(size)
         self.augmenter = augmenter_cls(cutoff)
+        if hasattr(self.augmenter, 'workers'):
+            self.augmenter.workers = 1
+        self.encoder = encoder
         self.x_zip = int(x_zip)
+        self.workers = int(workers or 1)
         self.zipname = f'dataset_{self.timestamp}'
     
     @property
@@ -88,51 +146,75 @@ class Zipper:
         return str(datetime.utcnow().timestamp()).replace('.', '')
 
     def __call__(self):
-        for i, accumulator in enumerate(self):
+        entries = self._entries()
+        for i, entry in enumerate(entries):
             zipname = f'{self.zipname}{i:02}.zip'
-            p = Process(target=self._archive, args=(zipname, accumulator))
-            p.start()
-            p.join()
+            self._archive(zipname, chain((entry,), islice(entries, self.x_zip - 1)))
 
     def __iter__(self):
-        tmpdir = mkdtemp(prefix='images')
-        count = 0
-        accumulator = []
-        for filepath in self.files:
-            info('processing file %s', path.basename(filepath))
-            basename = self._basename()
-            label = self.labeller(filepath)
-            norm = self.norm(filepath)
-            ext = self._ext(filepath)
-            for i, data in enumerate(self.augmenter(norm)):
-                count += 1
-                name = f'{basename}{i:03}.{ext}'
-                tmpname = path.join(tmpdir, name)
-                plt.imsave(tmpname, data)
-                archive = path.join(label, name)
-                accumulator.append((tmpname, archive))
-                if count % self.x_zip == 0:
-                    yield(accumulator)
-                    accumulator = []
-        if accumulator:
-            yield(accumulator)
-
-    def _archive(self, zipname, accumulator):
-        info('creating compressed file %s', zipname)
-        with ZipFile(zipname, 'w') as zfile:
-            for filepath, archive in accumulator:
-                zfile.write(filepath, arcname=archive)
+        entries = self._entries()
+        for entry in entries:
+            yield [entry, *islice(entries, self.x_zip - 1)]
+
+    def _entries(self):
+        for entries in self._augmented():
+            yield from entries
+
+    def _augmented(self):
+        initargs = (self.labeller, self.norm, self.augmenter, self.encoder)
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=initargs) as executor:
+            pending = deque()
+            for filepath in self.files:
+                pending.append(executor.submit(_augment, filepath, self._basename()))
+                if len(pending) >= self.workers * self.PENDING:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _archive(self, zipname, entries):
+        logger.info('creating compressed file %s', zipname)
+        with open(zipname, 'wb', buffering=self.BUFFER) as f, ZipFile(f, 'w', compression=self.COMPRESSION, allowZip64=True) as zfile:
+            date_time = localtime()[:6]
+            for data, archive in entries:
+                zfile.writestr(self._zipinfo(archive, date_time), data)
+
+    def _zipinfo(self, archive, date_time):
+        zinfo = ZipInfo(archive, date_time=date_time)
+        zinfo.compress_type = self.COMPRESSION
+        zinfo.external_attr = self.PERMISSIONS << 16
+        return zinfo
 
     def _files(self, folder):
         folder = path.expanduser(folder)
-        return (f for f in glob(path.join(folder, '*')) if self._valid(f))
+        return [f for f in glob(path.join(folder, '*')) if self._valid(f)]
 
     def _basename(self):
-        return ''.join(choices(ascii_letters + digits, k=self.MAXLEN))
+        return token_urlsafe(self.MAXLEN)[:self.MAXLEN]
 
     def _valid(self, filepath):
         ext = self._ext(filepath)
         return ext in self.EXTS
 
-    def _ext(self, filepath):
+    @staticmethod
+    def _ext(filepath):
         return filepath.rsplit('.', 1)[-1].lower()
+
+
+def _init_worker(labeller, normalizer, augmenter, encoder):
+    global _worker
+    _worker = (labeller, normalizer, augmenter, encoder)
+
+
+def _augment(filepath, basename):
+    labeller, normalizer, augmenter, encoder = _worker
+    logger.info('processing file %s', path.basename(filepath))
+    label = labeller(filepath)
+    norm = normalizer(filepath)
+    ext = Zipper._ext(filepath)
+    entries = []
+    for i, data in enumerate(augmenter(norm)):
+        name = f'{basename}{i:03}.{ext}'
+        stream = encoder(data, ext, BytesIO())
+        archive = path.join(label, name)
+        entries.append((stream.getvalue(), archive))
+    return entries
@@ -1,78 +1,174 @@
+from functools import lru_cache
 import numpy as np
 from PIL import Image
 from PIL.ImageFilter import MaxFilter, MedianFilter, MinFilter, ModeFilter, UnsharpMask
-from scipy.ndimage import gaussian_filter, uniform_filter
+from scipy.ndimage import gaussian_filter, maximum_filter, minimum_filter, uniform_filter
 from skimage.exposure import adjust_gamma
-from skimage.transform import AffineTransform, rescale, rotate, warp
-from skimage.util import random_noise
+from skimage.transform import AffineTransform, warp
+from skimage.util import img_as_float32, img_as_ubyte
 
 
-class Blur:
+class Filter:
+    '''
+    Synopsis
+    --------
+    Base class of the filters, preparing the image to the DTYPE they compute with.
+    '''
+
+    DTYPE = np.uint8
+
+    def prepare(self, img):
+        return img
+
+    def valid_values(self, img, values):
+        return values
+
+
+class FloatFilter(Filter):
+    '''
+    Synopsis
+    --------
+    Base class of the filters computing in single precision floating point.
+    '''
+
+    DTYPE = np.float32
+
+    def prepare(self, img):
+        return np.ascontiguousarray(img_as_float32(img))
+
+    def _uint8(self, data):
+        return img_as_ubyte(data)
+
+
+class Affine(FloatFilter):
+    '''
+    Synopsis
+    --------
+    Base class of the geometric filters, warping the image by an affine matrix.
+    '''
+
+    MODE = 'edge'
+
+    def __call__(self, img, val):
+        matrix = self._matrix(img.shape, val)
+        if matrix is not None:
+            return self._uint8(warp(img, inverse_map=matrix, mode=self.MODE))
+
+    def valid_values(self, img, values):
+        return [val for val in values if self._matrix(img.shape, val) is not None]
+
+    @classmethod
+    @lru_cache(maxsize=4096)
+    def _matrix(cls, shape, val):
+        tf = cls._transform(shape, val)
+        if tf is not None:
+            return tf.params
+
+
+class Blur(Filter):
     VALUES = range(2, 8, 1)
 
     def __call__(self, img, axe):
         return uniform_filter(img, size=(axe, axe, 1))
 
 
-class Flip:
+class Flip(Filter):
     VALUES = (np.s_[:, ::-1], np.s_[::-1, :])
 
     def __call__(self, img, sl):
         return img[sl]
 
 
-class Gamma:
+class Gamma(Filter):
     VALUES = np.arange(.1, 2.55, .05)
     GAIN = .9
+    MAX = 255
 
     def __call__(self, img, gm):
+        if img.dtype == np.uint8:
+            return np.take(self._lut(gm), img)
         return adjust_gamma(img, gamma=gm, gain=self.GAIN)
 
+    @classmethod
+    @lru_cache(maxsize=128)
+    def _lut(cls, gm):
+        lut = cls.MAX * cls.GAIN * (np.linspace(0, 1, cls.MAX + 1) ** gm)
+        return np.minimum(lut, cls.MAX).astype(np.uint8)
 
-class Gaussian:
+
+class Gaussian(Filter):
     VALUES = np.arange(.2, 1.5, .1)
 
     def __call__(self, img, sigma):
-        return gaussian_filter(img, sigma)
+        return gaussian_filter(img, (sigma, sigma, 0))
 
 
-class Noise:
-    VALUES = np.arange(.001, .0301, .001)
-    MODE = 'speckle'
+class Noise(Filter):
+    '''
+    Synopsis
+    --------
+    Applies speckle noise (img + img * N(0, var)) to the 8 bits image.
+    '''
 
-    def __call__(self, img, var):
-        return random_noise(img, mode=self.MODE, var=var)
+    VALUES = np.arange(.001, .0301, .001)
+    MAX = 255
 
+    def __init__(self):
+        self.rng = np.random.default_rng()
+        self._last = (None, None)
 
-class Rescale:
+    def __call__(self, img, var):
+        noise = np.roll(self._bank(img), self.rng.integers(img.size))
+        noise = noise.reshape(img.shape)
+        noise *= np.sqrt(var)
+        noise += 1
+        noise *= img
+        np.clip(noise, 0, self.MAX, out=noise)
+        return np.rint(noise, out=noise).astype(np.uint8)
+
+    def _bank(self, img):
+        last, bank = self._last
+        if last is not img:
+            bank = self.rng.standard_normal(img.size, dtype=np.float32)
+            self._last = (img, bank)
+        return bank
+
+
+class Rescale(Affine):
     VALUES = np.arange(1.05, 2.05, .03)
     MODE = 'constant'
 
-    def __call__(self, img, sc):
-        data = rescale(img, sc, mode=self.MODE, anti_aliasing=True, multichannel=True)
-        h, w, _ = data.shape
-        y, x, _ = img.shape
+    @classmethod
+    def _transform(cls, shape, sc):
+        y, x, _ = shape
+        w, h = round(x * sc), round(y * sc)
+        sx, sy = x / w, y / h
         cx = w // 2 - (x // 2)
         cy = h // 2 - (y // 2)
-        return data[cy:cy+y, cx:cx+x, :]
+        translation = ((cx + .5) * sx - .5, (cy + .5) * sy - .5)
+        return AffineTransform(scale=(sx, sy), translation=translation)
 
 
-class Rotate:
+class Rotate(Affine):
     VALUES = range(-155, 156, 1)
-    MODE = 'edge'
 
-    def __call__(self, img, ang):
+    @classmethod
+    def _transform(cls, shape, ang):
         if ang:
-            cval = 1. if self._RGB(img) else 0
-            return rotate(img, ang, cval=cval, mode=self.MODE)
+            y, x, _ = shape
+            center = np.array((x, y)) / 2. - .5
+            rotation = AffineTransform(rotation=np.deg2rad(ang))
+            return AffineTransform(translation=-center) + rotation + AffineTransform(translation=center)
 
-    def _RGB(self, img):
-        return img.shape[-1] == 3
 
+class Shift(Filter):
+    '''
+    Synopsis
+    --------
+    Translates the image by an integer vector, replicating the edge pixels.
+    '''
 
-class Shift:
     VALUES = range(-512, 512, 1)
-    MODE = 'edge'
     RATIO = 3
     VERTICAL = 'v'
     HORIZONTAL = 'h'
@@ -83,9 +179,14 @@ class Shift:
 
     def __call__(self, img, vec):
         if self._valid(img, vec):
-            vector = self._vector(vec)
-            tf = AffineTransform(translation=vector)
-            return warp(img, inverse_map=tf, mode=self.MODE)
+            h, w, _ = img.shape
+            x, y = self._vector(vec)
+            rows = np.clip(np.arange(y, h + y), 0, h - 1)
+            cols = np.clip(np.arange(x, w + x), 0, w - 1)
+            return img.take(rows, axis=0).take(cols, axis=1)
+
+    def valid_values(self, img, values):
+        return [vec for vec in values if self._valid(img, vec)]
 
     def _vector(self, vec):
         if self.vertical:
@@ -105,28 +206,32 @@ class Shift:
             return vec < min(w, h)
 
 
-class Skew:
+class Skew(Affine):
     VALUES = np.arange(-.3, .4, .05)
-    MODE = 'edge'
     MIN = .09
 
-    def __call__(self, img, shear):
-        if abs(shear) > self.MIN:
-            tf = AffineTransform(shear=shear)
-            return warp(img, inverse_map=tf, mode=self.MODE)
+    @classmethod
+    def _transform(cls, shape, shear):
+        if abs(shear) > cls.MIN:
+            return AffineTransform(shear=shear)
 
 
-class Pixel:
+class Pixel(Filter):
     VALUES = range(3, 12, 2)
     FILTERS = {'max': MaxFilter, 'median': MedianFilter, 'min': MinFilter, 'mode': ModeFilter}
+    SEPARABLES = {MaxFilter: maximum_filter, MinFilter: minimum_filter}
     OVERSIZES = {300: 7, 200: 5, 100: 3}
+    MODE = 'nearest'
 
     def __init__(self, _filter):
         self.filter = self.FILTERS.get(_filter, MinFilter)
+        self.separable = self.SEPARABLES.get(self.filter)
 
     def __call__(self, img, size):
         if self._oversized(img, size):
             return
+        if self.separable:
+            return self.separable(img, size=(size, size, 1), mode=self.MODE)
         img = Image.fromarray(img)
         filtered = img.filter(self.filter(size))
         return np.array(filtered)
@@ -139,7 +244,7 @@ class Pixel:
                 return True
 
 
-class Unsharp:
+class Unsharp(Filter):
     VALUES = range(1, 51, 1)
 
     def __call__(self, img, radius):
@@ -1,10 +1,17 @@
-from os import path
-from logging import debug, info
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+from hashlib import sha1
+from os import cpu_count, makedirs, path, replace
+from logging import getLogger
+from mmap import ACCESS_READ, mmap
 from struct import unpack
-from matplotlib import pyplot as plt
+from tempfile import mkstemp
 import numpy as np
 from PIL import Image
-from imgaug import filters
+
+logger = getLogger(__name__)
 
 
 class Labeller:
@@ -29,7 +36,8 @@ class Labeller:
         self.separators = separators
 
     def __call__(self, name):
-        name, _ = path.basename(name).split('.')
+        name, dot, ext = path.basename(name).rpartition('.')
+        name = name if dot else ext
         for sep in self.separators:
             label = self._tokenize(name, sep)
             if label:
@@ -37,7 +45,7 @@ class Labeller:
         return name[:self.digits]
 
     def _tokenize(self, name, sep):
-        if name.count(sep) > 0:
+        if sep in name:
             label = ''
             for token in name.split(sep):
                 label += token
@@ -52,6 +60,8 @@ class Normalizer:
     Normalizes the specified image by:
     - resizing the largest dimension to specified max size
     - creating a squared canvas by max size and pasting the image in front of it
+    When a cache folder is specified, normalized image files are saved there as
+    Numpy files, to be loaded by subsequent runs, and memoized in process.
 
     Examples
     --------
@@ -66,11 +76,27 @@ class Normalizer:
     WHITE = (255, 255, 255)
     CANVAS = False
     RGBA = 'RGBA'
+    MODES = ('RGB', RGBA)
     PNG = 'PNG'
+    CACHE = None
+    MEMO = 1024
+    REDUCING_GAP = 3.
+    RESAMPLE = Image.Resampling.BILINEAR
     
-    def __init__(self, size=SIZE, canvas=CANVAS):
+    def __init__(self, size=SIZE, canvas=CANVAS, cache=CACHE):
         self.size = int(size)
         self.canvas = canvas
+        self.cache = cache and path.expanduser(cache)
+        self._memo = lru_cache(maxsize=self.MEMO)(self._load)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_memo']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = lru_cache(maxsize=self.MEMO)(self._load)
 
     @property
     def is_bkg(self):
@@ -79,36 +105,75 @@ class Normalizer:
         return filepath or stream
 
     def __call__(self, name):
+        if self._cacheable(name):
+            name = path.abspath(name)
+            return np.array(self._memo(name, path.getmtime(name)))
+        return self._normalize(name)
+
+    def _load(self, name, mtime):
+        key = sha1(f'{name}:{mtime}:{self.size}:{self.canvas}'.encode()).hexdigest()
+        filename = path.join(self.cache, f'{key}.npy')
+        if path.isfile(filename):
+            logger.debug('loading cached image %s', filename)
+            return np.load(filename, mmap_mode='r')
+        img = self._normalize(name)
+        makedirs(self.cache, exist_ok=True)
+        fd, tmpname = mkstemp(dir=self.cache, suffix='.tmp')
+        with open(fd, 'wb') as f:
+            np.save(f, img)
+        replace(tmpname, filename)
+        img.flags.writeable = False
+        return img
+
+    def _cacheable(self, name):
+        return bool(self.cache) and isinstance(name, str) and not hasattr(self.canvas, 'read')
+
+    def _normalize(self, name):
         img = self._resize(name)
         if img:
             if self.canvas:
-                img = self._canvas(img)
+                return self._canvas(img)
             return np.array(img)
 
     def _resize(self, name):
-        img = Image.open(name)
-        if img.format == self.PNG:
-            img = img.convert(self.RGBA)
-        w, h = img.size
-        _max = max(w, h)
-        ratio = _max / self.size
-        size = (int(w // ratio), int(h // ratio))
-        info('resizing image to %r', size)
-        return img.resize(size)
+        with self._open(name) as img:
+            w, h = img.size
+            _max = max(w, h)
+            ratio = _max / self.size
+            size = (int(w // ratio), int(h // ratio))
+            img.draft(img.mode, size)
+            if img.format == self.PNG:
+                img = img.convert(self.RGBA)
+            logger.info('resizing image to %r', size)
+            return img.resize(size, self.RESAMPLE, reducing_gap=self.REDUCING_GAP)
 
     def _canvas(self, img):
         size = (self.size, self.size)
-        offset = self._offset(img)
+        x, y = self._offset(img)
         if self.is_bkg:
-            info('applying background')
-            c = Image.open(self.canvas).convert(img.mode)
-            c = c.resize(size)
-            c.paste(img, offset, img.convert(self.RGBA))
-        else:
-            info('applying squared canvas %r', size)
+            logger.info('applying background')
+            with self._open(self.canvas) as c:
+                c = c.convert(img.mode).resize(size, self.RESAMPLE, reducing_gap=self.REDUCING_GAP)
+            c.paste(img, (x, y), img.convert(self.RGBA))
+            return np.array(c)
+        logger.info('applying squared canvas %r', size)
+        if img.mode not in self.MODES:
             c = Image.new(img.mode, size, self._color(img))
-            c.paste(img, offset)
+            c.paste(img, (x, y))
+            return np.array(c)
+        data = np.asarray(img)
+        h, w, _ = data.shape
+        c = np.full(size + data.shape[2:], self._color(img), dtype=data.dtype)
+        c[y:y+h, x:x+w] = data
         return c
+
+    @contextmanager
+    def _open(self, name):
+        if not isinstance(name, str):
+            yield Image.open(name)
+            return
+        with open(name, 'rb') as f, mmap(f.fileno(), 0, access=ACCESS_READ) as mm:
+            yield Image.open(mm)
     
     def _color(self, img):
         if img.mode == self.RGBA:
@@ -130,38 +195,113 @@ class Augmenter:
     transformations by applying a list of predefined filters.
     Filter is expected to be a callable object accepting the image data and a
     value, that falls within the acceptable VALUES range.
+    Filters run on a pool of workers threads, computing up to prefetch images
+    ahead of the consumer.
 
     Examples
     --------
     >>> aug = Augmenter(cutoff=.5)
     >>> aug('resources/bag.png').__class__.__name__
     'generator'
+    >>> aug.batch(np.zeros((8, 8, 3), dtype=np.uint8)).shape[1:]
+    (8, 8, 3)
     '''
 
     CUTOFF = 1.
-    FILTERS = (filters.Blur(), filters.Flip(), filters.Gamma(), filters.Gaussian(), filters.Noise(), filters.Rescale(), filters.Rotate(), filters.Shift('*'), filters.Shift('h'), filters.Shift('v'), filters.Skew(), filters.Pixel('max'), filters.Pixel('median'), filters.Pixel('min'), filters.Pixel('mode'), filters.Unsharp())
+    WORKERS = cpu_count()
+    PREFETCH = 2
+    RGBA = 'RGBA'
+    MODES = ('RGB', RGBA)
+    FILTERS = None
 
-    def __init__(self, cutoff=CUTOFF):
+    def __init__(self, cutoff=CUTOFF, workers=WORKERS, prefetch=PREFETCH):
         self.cutoff = float(cutoff) or self.CUTOFF
+        self.workers = int(workers or 1)
+        self.prefetch = int(prefetch)
+        self.plan = self._plan(self.cutoff)
+
+    @cached_property
+    def count(self):
+        return sum(len(values) for _, values in self.plan) + 1
     
     def __call__(self, name):
-        info('apply transformations to image')
+        logger.info('apply transformations to image')
         img = self._img(name)
         yield img
-        for _filter in self.FILTERS:
-            for val in self._cut(_filter.VALUES):
-                filtered = _filter(img, val)
-                if filtered is not None:
-                    debug('applied filter %s with value %s', _filter.__class__.__name__, val)
-                    yield(filtered)
+        views = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for _filter, values in self.plan:
+                data = self._view(views, _filter, img)
+                for val in self._values(_filter, data, values):
+                    pending.append(executor.submit(self._apply, _filter, data, val))
+                    if len(pending) >= self.workers + self.prefetch:
+                        yield from self._done(pending.popleft())
+            while pending:
+                yield from self._done(pending.popleft())
+
+    def batch(self, name):
+        img = self._img(name)
+        count = sum(len(self._values(_filter, img, values)) for _filter, values in self.plan) + 1
+        out = np.empty((count,) + img.shape, dtype=np.uint8)
+        i = 0
+        for i, data in enumerate(self(img)):
+            out[i] = data
+        if i + 1 < count:
+            return out[:i+1].copy()
+        return out
+
+    def _view(self, views, _filter, img):
+        dtype = getattr(_filter, 'DTYPE', np.uint8)
+        if dtype not in views:
+            prepare = getattr(_filter, 'prepare', None)
+            views[dtype] = prepare(img) if prepare else img
+        return views[dtype]
+
+    def _values(self, _filter, data, values):
+        valid_values = getattr(_filter, 'valid_values', None)
+        return valid_values(data, values) if valid_values else values
+
+    def _apply(self, _filter, data, val):
+        filtered = _filter(data, val)
+        if filtered is not None:
+            logger.debug('applied filter %s with value %s', _filter.__class__.__name__, val)
+        return filtered
+
+    def _done(self, future):
+        filtered = future.result()
+        if filtered is not None:
+            yield filtered
 
     def _img(self, name):
         if isinstance(name, np.ndarray):
-            return name
-        return plt.imread(name)
+            if name.dtype == np.uint8:
+                return name
+            from skimage.util import img_as_ubyte
+            return img_as_ubyte(name)
+        with Image.open(name) as img:
+            if img.mode not in self.MODES:
+                img = img.convert(self.RGBA)
+            return np.asarray(img)
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _plan(cls, cutoff):
+        return tuple((_filter, cls._cut(_filter.VALUES, cutoff)) for _filter in cls._filters())
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _filters(cls):
+        if cls.FILTERS is not None:
+            return tuple(cls.FILTERS)
+        from imgaug import filters
+        return (filters.Blur(), filters.Flip(), filters.Gamma(), filters.Gaussian(), filters.Noise(), filters.Rescale(), filters.Rotate(), filters.Shift('*'), filters.Shift('h'), filters.Shift('v'), filters.Skew(), filters.Pixel('max'), filters.Pixel('median'), filters.Pixel('min'), filters.Pixel('mode'), filters.Unsharp())
 
-    def _cut(self, rng):
-        if self.cutoff >= 1 or isinstance(rng, tuple):
+    @staticmethod
+    def _cut(rng, cutoff):
+        if isinstance(rng, np.ndarray):
+            rng = rng.tolist()
+        if cutoff >= 1 or isinstance(rng, tuple):
             return rng
-        sl = round(len(rng) * self.cutoff) or 1
+        sl = round(len(rng) * cutoff) or 1
         return rng[:sl]
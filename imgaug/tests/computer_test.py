@@ -1,8 +1,27 @@
 import unittest
+from os import listdir, path
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile
 from imgaug import computer, image
 
 
 class TestComputer(unittest.TestCase):
+    def test_encoder(self):
+        enc = computer.Encoder()
+        data = computer.np.full((8, 8, 3), .5)
+        stream = enc(data, 'jpg', computer.BytesIO())
+        img = computer.Image.open(stream)
+        self.assertEqual(img.format, 'JPEG')
+        self.assertEqual(img.size, (8, 8))
+
+    def test_encoder_rgba_jpeg(self):
+        enc = computer.Encoder()
+        data = computer.np.zeros((8, 8, 4), dtype=computer.np.uint8)
+        stream = enc(data, 'jpg', computer.BytesIO())
+        img = computer.Image.open(stream)
+        self.assertEqual(img.format, 'JPEG')
+        self.assertEqual(img.mode, 'RGB')
+
     def test_persister(self):
         pers = computer.Persister('resources/bag.png', augmenter=image.Augmenter(0.1))
         self.assertEqual(pers.label, 'bag')
@@ -24,6 +43,46 @@ class TestComputer(unittest.TestCase):
                 else:
                     self.assertTrue(archive.endswith('.png'))
 
+    def test_zipper_basename(self):
+        zipper = computer.Zipper('resources')
+        basenames = {zipper._basename() for _ in range(100)}
+        self.assertEqual(len(basenames), 100)
+        self.assertTrue(all(len(b) == zipper.MAXLEN for b in basenames))
+
+    def test_zipper_archive(self):
+        zipper = computer.Zipper('resources', size=8, cutoff=.01)
+        with TemporaryDirectory() as tmpdir:
+            zipper.zipname = path.join(tmpdir, 'dataset')
+            zipper()
+            with ZipFile(f'{zipper.zipname}00.zip') as zfile:
+                names = zfile.namelist()
+                self.assertTrue(names)
+                self.assertIsNone(zfile.testzip())
+                for info in zfile.infolist():
+                    self.assertEqual(info.compress_type, computer.ZIP_STORED)
+
+    def test_zipper_archive_x_zip(self):
+        zipper = computer.Zipper('resources', x_zip=15, size=8, cutoff=.01)
+        with TemporaryDirectory() as tmpdir:
+            zipper.zipname = path.join(tmpdir, 'dataset')
+            zipper()
+            zipnames = sorted(listdir(tmpdir))
+            self.assertEqual(len(zipnames), 4)
+            for zipname in zipnames:
+                with ZipFile(path.join(tmpdir, zipname)) as zfile:
+                    self.assertLessEqual(len(zfile.namelist()), 15)
+
+    def test_zipper_worker(self):
+        zipper = computer.Zipper('resources', size=8, cutoff=.01)
+        self.assertEqual(zipper.augmenter.workers, 1)
+        computer._init_worker(zipper.labeller, zipper.norm, zipper.augmenter, zipper.encoder)
+        entries = computer._augment('resources/bag.png', 'abcde')
+        self.assertEqual(entries[0][1], path.join('bag', 'abcde000.png'))
+
+    def test_zipper_augmenter_cls(self):
+        zipper = computer.Zipper('resources', cutoff=.01, augmenter_cls=lambda cutoff: image.Augmenter(cutoff))
+        self.assertEqual(zipper.augmenter.workers, 1)
+
     def test_zipper_x_zip(self):
         zipper = computer.Zipper('resources', x_zip=15, size=8, cutoff=.01)
         for i, accumulator in enumerate(zipper):
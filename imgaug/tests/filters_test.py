@@ -9,6 +9,13 @@ class TestFilters(unittest.TestCase):
         img = filters.Image.open('resources/shirt.jpg')
         self.img = filters.np.asarray(img)
 
+    def test_prepare(self):
+        self.assertIs(filters.Blur().prepare(self.img), self.img)
+        data = filters.Rotate().prepare(self.img)
+        self.assertEqual(data.dtype, filters.Rotate.DTYPE)
+        self.assertTrue(data.flags.c_contiguous)
+        self.assertAlmostEqual(data.max(), self.img.max() / 255, places=6)
+
     def test_blur(self):
         with patch.object(filters, 'uniform_filter') as mocked:
             f = filters.Blur()
@@ -17,37 +24,65 @@ class TestFilters(unittest.TestCase):
 
     def test_flip(self):
         f = filters.Flip()
-        self.assertTrue(callable(f))
+        for sl in f.VALUES:
+            data = f(self.img, sl)
+            self.assertTrue(filters.np.shares_memory(data, self.img))
 
     def test_gamma(self):
+        f = filters.Gamma()
+        data = filters.adjust_gamma(self.img, gamma=.1, gain=.9).astype(int)
+        self.assertLessEqual(abs(f(self.img, .1) - data).max(), 1)
+        self.assertIs(f._lut(.1), filters.Gamma()._lut(.1))
+
+    def test_gamma_float(self):
         with patch.object(filters, 'adjust_gamma') as mocked:
             f = filters.Gamma()
-            f(self.img, .1)
-            mocked.assert_called_with(self.img, gamma=.1, gain=.9)
+            img = f.prepare(self.img) / 255.
+            f(img, .1)
+            mocked.assert_called_with(img, gamma=.1, gain=.9)
 
     def test_gaussian(self):
         with patch.object(filters, 'gaussian_filter') as mocked:
             f = filters.Gaussian()
             f(self.img, .1)
-            mocked.assert_called_with(self.img, .1)
+            mocked.assert_called_with(self.img, (.1, .1, 0))
 
     def test_noise(self):
-        with patch.object(filters, 'random_noise') as mocked:
-            f = filters.Noise()
-            f(self.img, .1)
-            mocked.assert_called_with(self.img, mode='speckle', var=.1)
+        f = filters.Noise()
+        self.assertTrue((f(self.img, 0) == self.img).all())
+        data = f(self.img, .1)
+        self.assertEqual(data.dtype, filters.np.uint8)
+        self.assertFalse((data == self.img).all())
+        self.assertFalse((f(self.img, .1) == data).all())
+        bank = f._bank(self.img)
+        self.assertIs(f._bank(self.img), bank)
+        self.assertIsNot(f._bank(self.img.copy()), bank)
 
     def test_rescale(self):
-        with patch.object(filters, 'rescale', return_value=self.img*1.5) as mocked:
-            f = filters.Rescale()
+        f = filters.Rescale()
+        img = f.prepare(self.img)
+        data = f(img, 1.5)
+        self.assertEqual(data.shape, img.shape)
+        with patch.object(filters, 'warp', return_value=self.img) as mocked:
             f(self.img, 1.5)
-            mocked.assert_called_with(self.img, 1.5, mode='constant', anti_aliasing=True, multichannel=True)
+            mocked.assert_called_with(self.img, inverse_map=f._matrix(self.img.shape, 1.5), mode='constant')
 
     def test_rotate(self):
-        with patch.object(filters, 'rotate') as mocked:
+        with patch.object(filters, 'warp', return_value=self.img) as mocked:
             f = filters.Rotate()
             f(self.img, -60)
-            mocked.assert_called_with(self.img, -60, cval=1, mode='edge')
+            _, kwargs = mocked.call_args
+            self.assertEqual(kwargs['mode'], 'edge')
+            self.assertIsNone(f(self.img, 0))
+
+    def test_affine_matrix(self):
+        matrix = filters.Rotate()._matrix(self.img.shape, 10)
+        self.assertIs(filters.Rotate()._matrix(self.img.shape, 10), matrix)
+        self.assertIsNone(filters.Skew()._matrix(self.img.shape, .05))
+
+    def test_affine_valid_values(self):
+        self.assertEqual(filters.Rotate().valid_values(self.img, [-1, 0, 1]), [-1, 1])
+        self.assertEqual(filters.Skew().valid_values(self.img, [-.3, .05, .3]), [-.3, .3])
 
     def test_shift_valid(self):
         h, w, _ = [d // 2 for d in self.img.shape]
@@ -55,28 +90,45 @@ class TestFilters(unittest.TestCase):
         self.assertFalse(filters.Shift('h')._valid(self.img, w))
         self.assertFalse(filters.Shift('v')._valid(self.img, h))
 
+    def test_shift_valid_values(self):
+        f = filters.Shift('h')
+        w = self.img.shape[1] // f.RATIO
+        self.assertEqual(f.valid_values(self.img, range(-w, w + 1)), [v for v in range(1 - w, w) if v])
+        self.assertEqual(filters.Blur().valid_values(self.img, range(3)), range(3))
+
     def test_shift_vectors(self):
         self.assertEqual(filters.Shift()._vector(10), (10, 10))
         self.assertEqual(filters.Shift('h')._vector(10), (10, 0))
         self.assertEqual(filters.Shift('v')._vector(10), (0, 10))
 
     def test_shift(self):
-        with patch.object(filters, 'warp') as mocked, patch.object(filters, 'AffineTransform', return_value=(10, 10)) as tr:
-            f = filters.Shift()
-            f(self.img, 10)
-            mocked.assert_called_with(self.img, inverse_map=tr(), mode='edge')
+        f = filters.Shift()
+        data = f(self.img, 10)
+        self.assertEqual(data.shape, self.img.shape)
+        self.assertTrue((data[:-10, :-10] == self.img[10:, 10:]).all())
+        self.assertTrue((data[-1, -1] == self.img[-1, -1]).all())
 
     def test_skew(self):
-        with patch.object(filters, 'warp') as mocked, patch.object(filters, 'AffineTransform', return_value=.3) as tr:
+        with patch.object(filters, 'warp', return_value=self.img) as mocked:
             f = filters.Skew()
             f(self.img, .3)
-            mocked.assert_called_with(self.img, inverse_map=tr(), mode='edge')
+            matrix = filters.AffineTransform(shear=.3).params
+            _, kwargs = mocked.call_args
+            self.assertTrue((kwargs['inverse_map'] == matrix).all())
+            self.assertEqual(kwargs['mode'], 'edge')
+            self.assertIs(f._matrix(self.img.shape, .3), kwargs['inverse_map'])
 
     def test_pixel(self):
         f = filters.Pixel('max')
         self.assertEqual(f.filter.__class__, filters.MaxFilter.__class__)
         self.assertTrue(callable(f))
 
+    def test_pixel_separable(self):
+        f = filters.Pixel('min')
+        data = filters.Image.fromarray(self.img).filter(filters.MinFilter(5))
+        self.assertTrue((f(self.img, 5) == filters.np.array(data)).all())
+        self.assertIsNone(filters.Pixel('median').separable)
+
     def test_pixel_oversizes(self):
         f = filters.Pixel('max')
         img = filters.np.resize(self.img, (64, 64, 3))
@@ -1,5 +1,20 @@
+import pickle
 import unittest
-from imgaug import image
+from io import BytesIO
+from os import listdir
+from tempfile import TemporaryDirectory
+from imgaug import filters, image
+
+
+class Invert:
+    VALUES = (255,)
+
+    def __call__(self, img, val):
+        return val - img
+
+
+class InvertAugmenter(image.Augmenter):
+    FILTERS = (Invert(),)
 
 
 class TestImage(unittest.TestCase):
@@ -23,6 +38,12 @@ class TestImage(unittest.TestCase):
         label = lbl('resources/corsa-rosso-saucony-koa-st-per-donna-rosso_2.jpg')
         self.assertEqual(label, 'corsa-rosso-saucony-koa-st-per-donna-rosso')
 
+    def test_labeller_dotted(self):
+        lbl = image.Labeller()
+        label = lbl('resources/v1.2_XXM56A0V430JK4V814-01.jpg')
+        self.assertEqual(label, 'v1.2_XXM56A0V430JK4V814')
+        self.assertEqual(lbl('resources/80038726'), '80038726')
+
     def test_labeller_plain(self):
         lbl = image.Labeller()
         label = lbl('resources/80038726.jpg')
@@ -39,11 +60,34 @@ class TestImage(unittest.TestCase):
             img = norm(f)
             self.assertEqual(img.shape, (42, 64, 4))
 
+    def test_normalization_cache(self):
+        with TemporaryDirectory() as tmpdir:
+            norm = image.Normalizer(size=64, cache=tmpdir)
+            img = norm('resources/bag.png')
+            img[0, 0] = 0
+            self.assertFalse((norm('resources/bag.png') == img).all())
+            self.assertEqual(listdir(tmpdir)[0].rsplit('.', 1)[-1], 'npy')
+            self.assertEqual(len(listdir(tmpdir)), 1)
+            cached = pickle.loads(pickle.dumps(norm))('resources/bag.png')
+            self.assertTrue(cached.flags.writeable)
+            self.assertTrue((cached == norm('resources/bag.png')).all())
+
+    def test_normalization_logging(self):
+        with self.assertLogs('imgaug', level='INFO') as logs:
+            image.Normalizer(size=64)._normalize('resources/bag.png')
+        self.assertEqual(logs.records[0].name, 'imgaug.image')
+
     def test_normalization_canvas(self):
         norm = image.Normalizer(size=64, canvas=True)
         img = norm('resources/bag.png')
         self.assertEqual(img.shape, (64, 64, 4))
 
+    def test_normalization_cmyk_canvas(self):
+        stream = BytesIO()
+        image.Image.new('CMYK', (32, 16)).save(stream, 'JPEG')
+        img = image.Normalizer(size=64, canvas=True)(stream)
+        self.assertEqual(img.shape, (64, 64, 4))
+
     def test_normalization_colored_canvas(self):
         norm = image.Normalizer(size=64, canvas='FF0000')
         img = norm('resources/bag.png')
@@ -60,11 +104,68 @@ class TestImage(unittest.TestCase):
             img = norm('resources/bag.png')
             self.assertEqual(img.shape, (64, 64, 4))
    
+    def test_augmenting_plan(self):
+        aug = image.Augmenter(.5)
+        self.assertEqual(len(aug.plan), len(aug._filters()))
+        _filter, values = aug.plan[0]
+        self.assertIsInstance(_filter, filters.Blur)
+        self.assertEqual(values, range(2, 5))
+        _, values = aug.plan[2]
+        self.assertIsInstance(values, list)
+        self.assertIsInstance(values[0], float)
+        self.assertIs(image.Augmenter(.5).plan, aug.plan)
+
     def test_augmenting(self):
         aug = image.Augmenter(.01)
         for img in aug('resources/shirt.jpg'):
             self.assertEqual(img.shape, (400, 304, 3))
 
+    def test_augmenting_filters(self):
+        class FlipAugmenter(image.Augmenter):
+            FILTERS = (filters.Flip(),)
+        aug = FlipAugmenter()
+        self.assertEqual(aug.count, 3)
+        self.assertEqual(len(list(aug('resources/bag.png'))), 3)
+
+    def test_augmenting_callable_filters(self):
+        img = image.np.zeros((8, 8, 3), dtype=image.np.uint8)
+        _, inverted = InvertAugmenter()(img)
+        self.assertTrue((inverted == 255).all())
+
+    def test_augmenting_workers(self):
+        img = image.Normalizer(size=32)('resources/bag.png')
+        sequential = list(image.Augmenter(.01, workers=1)(img))
+        concurrent = list(image.Augmenter(.01, workers=4)(img))
+        self.assertEqual(len(sequential), len(concurrent))
+        self.assertTrue((sequential[-1] == concurrent[-1]).all())
+
+    def test_augmenting_prefetch(self):
+        img = image.Normalizer(size=32)('resources/bag.png')
+        eager = list(image.Augmenter(.01, workers=1, prefetch=0)(img))
+        prefetched = list(image.Augmenter(.01, workers=1, prefetch=8)(img))
+        self.assertEqual(len(eager), len(prefetched))
+        self.assertTrue((eager[-1] == prefetched[-1]).all())
+
+    def test_augmenting_batch(self):
+        aug = image.Augmenter(.01)
+        imgs = list(aug('resources/shirt.jpg'))
+        batch = aug.batch('resources/shirt.jpg')
+        self.assertLessEqual(len(imgs), aug.count)
+        self.assertEqual(batch.shape, (len(imgs), 400, 304, 3))
+        self.assertTrue((batch[0] == imgs[0]).all())
+        self.assertIsNone(batch.base)
+
+    def test_augmenting_uint8(self):
+        aug = image.Augmenter(.01)
+        for img in aug('resources/bag.png'):
+            self.assertEqual(img.dtype, image.np.uint8)
+
+    def test_augmenting_array(self):
+        aug = image.Augmenter(.01)
+        data = image.np.zeros((8, 8, 3), dtype=image.np.uint8)
+        self.assertIs(aug._img(data), data)
+        self.assertEqual(aug._img(data / 255.).dtype, image.np.uint8)
+
 
 if __name__ == '__main__':
     unittest.main()
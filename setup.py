@@ -15,15 +15,19 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     url='https://github.com/costajob/image_augmenter',
     packages=setuptools.find_packages(),
+    python_requires='>=3.8,<4',
     install_requires=[
-        'matplotlib>=3.0',
-        'numpy>=1.16',
-        'Pillow>=5.4',
-        'scikit-image>=0.14',
-        'scipy>=1.2'
+        'numpy>=1.23.2,<3',
+        'Pillow>=9.3,<13',
+        'scikit-image>=0.20,<1',
+        'scipy>=1.9.1,<2'
     ],
     classifiers=[
-        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ]